@@ -29,6 +29,22 @@ FLAGS_TABLE = None
 FLAGS_DATA = {'check_interval': 30}
 
 
+def reset_module_state():
+    """
+    Discard the cached backend connectors and flag data, returning the module to
+    the state it is in when first loaded.
+    """
+    global BACKEND_TYPE
+    global SCORES_TABLE
+    global FLAGS_TABLE
+    global FLAGS_DATA
+
+    BACKEND_TYPE = None
+    SCORES_TABLE = None
+    FLAGS_TABLE = None
+    FLAGS_DATA = {'check_interval': 30}
+
+
 # Note that there is already an awslambda infrastructure module called init()
 # and this clobbers things, so it's renamed to a private scoped function.
 def __module_init(event, chain):
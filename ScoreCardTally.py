@@ -33,6 +33,24 @@ TEAM_SCORE_CACHE = {"timeout": 30}
 FLAGS_DATA = {"check_interval": 30}
 
 
+def reset_module_state():
+    """
+    Discard the cached backend connectors, team scores and flag data, returning
+    the module to the state it is in when first loaded.
+    """
+    global BACKEND_TYPE
+    global SCORES_TABLE
+    global FLAGS_TABLE
+    global TEAM_SCORE_CACHE
+    global FLAGS_DATA
+
+    BACKEND_TYPE = None
+    SCORES_TABLE = None
+    FLAGS_TABLE = None
+    TEAM_SCORE_CACHE = {"timeout": 30}
+    FLAGS_DATA = {"check_interval": 30}
+
+
 # Note that there is already an awslambda infrastructure module called init()
 # and this clobbers things, so it's renamed to a private scoped function.
 def __module_init(event, chain):
@@ -15,7 +15,6 @@ import ssl
 import sys
 import threading
 import time
-from copy import deepcopy
 from hashlib import sha256
 
 from SimpleWebSocketServer import (SimpleSSLWebSocketServer,
@@ -111,7 +110,7 @@ def get_team_score(scores_table, flags_table, teams):
     }
 
     for team in teams:
-        event = deepcopy(event_base)
+        event = dict(event_base)
         event["team"] = team
         try:
             resp = ScoreCardTally.lambda_handler(event, None)
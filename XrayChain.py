@@ -318,45 +318,137 @@ class Chain(object):
 
     def recursive_flush(self):
         """
-        Flush this chain, and all child chains recursively. Useful for flushing all segments that were collected over a period, all the way to the bottom of the chain tree.
+        Flush this chain, and all child chains recursively. Useful for flushing
+        all segments that were collected over a period, all the way to the
+        bottom of the chain tree.
+
+        The segments from the whole tree are submitted together, so that a
+        trace costs one round trip to X-Ray rather than one per chain.
         """
-        self.flush()
-        for chain in self.children:
-            chain.recursive_flush()
+        segments = self.__collect_segments()
+        for start in range(0, len(segments), self.backlog):
+            self.__submit(segments[start:start + self.backlog])
+        return len(segments)
 
-    def flush(self):
+    def __collect_segments(self):
         """
-        Flush the segment buffer. Can be called by a client before the backlog is
-        filled. Is called when a segment is logged and the backlog is filled.
+        Take the buffered segments from this chain and all of its descendants,
+        leaving their buffers empty.
         """
-        self.flush_lock.acquire()
-        if len(self.segments) == 0:
-            self.flush_lock.release()
-            return 0
+        with self.flush_lock:
+            segments = self.segments
+            self.segments = []
+        for chain in self.children:
+            segments.extend(chain.__collect_segments())
+        return segments
 
-        nsegments = len(self.segments)
-        if Chain.__client is not None and \
-            not os.environ.get("SQUELCH_XRAY", "FALSE") == "TRUE":
-            for segment in self.segments:
+    def __submit(self, segments):
+        """
+        Send the given segments to X-Ray in a single call, unless this chain is
+        mocked or there is no client, logging them unless squelched.
+        """
+        squelched = os.environ.get("SQUELCH_XRAY", "FALSE") == "TRUE"
+        if Chain.__client is not None and not squelched:
+            for segment in segments:
                 sys.stderr.write(segment + "\n")
-            sys.stderr.write("Submitting %d segments\n" % len(self.segments))
+            sys.stderr.write("Submitting %d segments\n" % len(segments))
         if Chain.__client is not None and not self.mock:
             resp = Chain.__client.put_trace_segments(
-                TraceSegmentDocuments=self.segments)
+                TraceSegmentDocuments=segments)
         else:
             resp = {
                 "MockXray": True,
                 "NoneClient": Chain.__client is None,
                 "ExplicitlyMocked": self.mock
             }
-        if Chain.__client is not None and \
-            not os.environ.get("SQUELCH_XRAY", "FALSE") == "TRUE":
+        if Chain.__client is not None and not squelched:
             sys.stderr.write(json.dumps(resp) + "\n")
-        self.segments = []
-        self.flush_lock.release()
+
+    def flush(self):
+        """
+        Flush the segment buffer. Can be called by a client before the backlog is
+        filled. Is called when a segment is logged and the backlog is filled.
+        """
+        with self.flush_lock:
+            if len(self.segments) == 0:
+                return 0
+
+            nsegments = len(self.segments)
+            self.__submit(self.segments)
+            self.segments = []
         return nsegments
 
 
+class NullChain(object):
+    """
+    A stand-in for a Chain that records nothing, for calls that are not being
+    traced. It supports the same logging, tracing, and forking calls as a Chain,
+    but they do no work, and forks return the same NullChain.
+    """
+    mock = True
+
+    def fork_subsegment(self, parent_id=None):
+        """
+        Return this chain, as there is nothing to fork.
+        """
+        return self
+
+    def fork_root(self, parent_id=None):
+        """
+        Return this chain, as there is nothing to fork.
+        """
+        return self
+
+    def log(self, *args, **kwargs):
+        """
+        Discard the segment.
+        """
+        return None
+
+    def log_start(self, name):
+        """
+        Discard the segment.
+        """
+        return None
+
+    def log_end(self, segment_id, metadata=None, annotations=None, http=None):
+        """
+        Discard the segment.
+        """
+        return None
+
+    def trace(self, name):
+        """
+        Return a decorator that leaves the target function unwrapped.
+        """
+        return _untraced
+
+    def trace_associated(self, name):
+        """
+        Return a decorator that leaves the target function unwrapped.
+        """
+        return _untraced
+
+    def recursive_flush(self):
+        """
+        Nothing is ever buffered, so there is nothing to flush.
+        """
+        return 0
+
+    def flush(self):
+        """
+        Nothing is ever buffered, so there is nothing to flush.
+        """
+        return 0
+
+
+def _untraced(target):
+    """
+    A decorator that returns the target function as-is.
+    """
+    return target
+
+
 def lambda_handler(event, context):
     import time
     root = Chain()
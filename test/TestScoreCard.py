@@ -5,12 +5,10 @@ Unit tests for the submission logic
 from __future__ import print_function
 
 import os
-import sys
-import copy
 import time
 import uuid
 import unittest
-import traceback
+from functools import reduce
 from random import randint, random
 from decimal import Decimal
 
@@ -19,161 +17,230 @@ import moto
 
 import ScoreCardSubmit
 import ScoreCardTally
+import util
 
 from util import binomial_list, coin_toss, coin_toss_counts, coin_toss_range
+from helpers import random_team_id
+
+try:
+    from math import comb
+except ImportError:
+    from math import factorial
+
+    def comb(n, k):
+        """
+        The exact binomial coefficient, for Pythons without math.comb().
+        """
+        return factorial(n) // (factorial(k) * factorial(n - k))
+
+try:
+    from time import perf_counter
+except ImportError:
+    # Python 2 has no perf_counter(), so fall back to the wall clock.
+    from time import time as perf_counter
+
+
+# Submissions that are rejected without touching the scores table, as the case
+# name, the fields added to the event, and the number of client errors expected.
+# Zero errors means the input is valid, but the flag doesn't exist.
+SUBMIT_VALIDATION_CASES = [
+    ("missing team and flag", {}, 2),
+    ("missing flag", {"team": "10"}, 1),
+    ("missing team", {"flag": ""}, 1),
+    ("nonintegral team", {"team": "abcde", "flag": ""}, 1),
+    ("integral team, nonexistent flag", {"team": "10", "flag": ""}, 0),
+]
+
+
+class FakeClock(object):
+    """
+    Stands in for the time module in the modules under test, so that tests can
+    move time forward instead of sleeping. Only time() is faked, and everything
+    else is looked up on the real time module.
+    """
+
+    def __init__(self, now=None):
+        self.now = time.time() if now is None else now
+
+    def time(self):
+        """
+        Return the current fake time.
+        """
+        return self.now
+
+    def advance(self, seconds):
+        """
+        Move the fake time forward by the given number of seconds.
+        """
+        self.now += seconds
+
+    def __getattr__(self, name):
+        """
+        Fall back to the real time module for anything other than time().
+        """
+        return getattr(time, name)
+
+
+# The moto mocks, DynamoDB resource, and backend tables shared by every test
+# class in the module. Backends are keyed by the flag indices they were
+# populated with and whether they have a scores table, so classes asking for
+# the same backend reuse the same tables.
+SHARED_BACKEND = {"mocks": [], "ddb_resource": None, "backends": {}}
+
+
+def setUpModule():
+    """
+    If there is no AWS region set in the environment, then configure the
+    default region as US-EAST-1.
+
+    Start the moto mocks once for the module, since the backend tables created
+    under them are shared between test classes.
+    """
+    os.environ["MOCK_XRAY"] = "TRUE"
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    SHARED_BACKEND["mocks"] = [moto.mock_dynamodb2()]
+    for mock in SHARED_BACKEND["mocks"]:
+        mock.start()
+    # Created once the mocks are running, and shared by everything that
+    # touches the tables, to only load the DynamoDB service model once.
+    SHARED_BACKEND["ddb_resource"] = boto3.resource("dynamodb")
+
+
+def tearDownModule():
+    """
+    Stop the moto mocks, discarding the tables created under them.
+    """
+    for mock in SHARED_BACKEND["mocks"]:
+        mock.stop()
+    SHARED_BACKEND["mocks"] = []
+    SHARED_BACKEND["ddb_resource"] = None
+    SHARED_BACKEND["backends"] = {}
 
-def helpful_assert_equal(lhs, rhs):
-    try:
-        assert lhs == rhs
-    except AssertionError as e:
-        print("LHS:", lhs, file=sys.stderr)
-        print("RHS:", rhs, file=sys.stderr)
-        print("\n".join(traceback.format_stack()), file=sys.stderr)
-        raise e
 
 class ScoreCardTest(unittest.TestCase):
     """
     Setup and teardown shared by all ScoreCard tests.
     """
 
+    # The indices of the flags from populate_flags() to put in the flags table,
+    # or None for all of them.
+    flag_indices = None
+
+    # Whether to create the scores table, which tests that never get as far as
+    # reading or writing a score can do without.
+    create_scores = True
+
     @classmethod
     def setUpClass(cls):
         """
-        If there is no AWS region set from the environment provider, then configure
-        the default region as US-EAsT-1
+        Fetch the backend tables for the class's flags, creating them if no
+        earlier class has, since table creation dominates the cost of each test.
         """
-        os.environ["MOCK_XRAY"] = "TRUE"
-        if boto3.Session().region_name is None:
-            os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+        cls.ddb_resource = SHARED_BACKEND["ddb_resource"]
+        key = (None if cls.flag_indices is None else tuple(cls.flag_indices),
+               cls.create_scores)
+        if key not in SHARED_BACKEND["backends"]:
+            SHARED_BACKEND["backends"][key] = cls.setup_dynamodb_backend()
+        cls.class_ddb_event = SHARED_BACKEND["backends"][key]
+
+        # The expected bitmask when only the flag at each index is claimed.
+        n_flags = len(cls.class_ddb_event["Flags"])
+        cls.flag_bitmasks = {
+            i: [j == i for j in range(n_flags)] for i in range(n_flags)}
 
-    def populate_flags(self, table_name=None, timeout=0.75):
+    @classmethod
+    def populate_flags(cls, table_name=None, timeout=0.75, indices=None):
         """
         Generate and populate a collection of randomly generated flags, and return
-        them.
+        them. If indices are given, only the flags at those indices are kept.
         """
+        timeout = Decimal(str(timeout))
         flags = [
             # A simple durable flag
             {
-                "flag": str(uuid.uuid1())
+                "flag": str(uuid.uuid4())
             },
             # A durable flag with an auth key for one team
             {
-                "flag": str(uuid.uuid1()),
+                "flag": str(uuid.uuid4()),
                 "auth_key": {
-                    str(randint(10**35, 10**36)): "1"
+                    str(random_team_id()): "1"
                 }
             },
             # A simple recovable-alive flag, "yes" unspecified
             {
-                "flag": str(uuid.uuid1()),
-                "timeout": Decimal(timeout)
+                "flag": str(uuid.uuid4()),
+                "timeout": timeout
             },
             # A recovable-alive flag with an auth key for one team, "yes" unspecified
             {
-                "flag": str(uuid.uuid1()),
-                "timeout": Decimal(timeout),
+                "flag": str(uuid.uuid4()),
+                "timeout": timeout,
                 "auth_key": {
-                    str(randint(10**35, 10**36)): "2"
+                    str(random_team_id()): "2"
                 }
             },
             # A simple recovable-alive flag, "yes" specified to TRUE
             {
-                "flag": str(uuid.uuid1()),
-                "timeout": Decimal(timeout),
+                "flag": str(uuid.uuid4()),
+                "timeout": timeout,
                 "yes": True
             },
             # A recovable-alive flag with an auth key for one team, "yes" specified to TRUE
             {
-                "flag": str(uuid.uuid1()),
-                "timeout": Decimal(timeout),
+                "flag": str(uuid.uuid4()),
+                "timeout": timeout,
                 "auth_key": {
-                    str(randint(10**35, 10**36)): "2"
+                    str(random_team_id()): "2"
                 },
                 "yes": True
             },
             # A simple recovable-dead flag
             {
-                "flag": str(uuid.uuid1()),
-                "timeout": Decimal(timeout),
+                "flag": str(uuid.uuid4()),
+                "timeout": timeout,
                 "yes": False
             },
             # A recovable-dead flag with an auth key for one team
             {
-                "flag": str(uuid.uuid1()),
-                "timeout": Decimal(timeout),
+                "flag": str(uuid.uuid4()),
+                "timeout": timeout,
                 "auth_key": {
-                    str(randint(10**35, 10**36)): "3"
+                    str(random_team_id()): "3"
                 },
                 "yes": False
             },
             # A simple durable flag that WILL NOT HAVE A WEIGHT
             {
-                "flag": str(uuid.uuid1())
+                "flag": str(uuid.uuid4())
             },
         ]
 
-        if table_name is not None:
-            flags_table = boto3.resource("dynamodb").Table(table_name)
-        else:
-            flags_table = None
-
-        for flag_id in range(len(flags)):
-            flag = flags[flag_id]
-            if flag_id < len(flags) - 1:
-                flag["weight"] = flag_id + 1
-            else:
-                pass
-            if flags_table is not None:
-                flags_table.put_item(Item=flag)
-
-        return flags
-
-    def setup_s3_backend(self):
-        """
-        Create the AWS resources for an S3 key-value backend, and return the
-        event body template
-        """
-        s3_client = boto3.client("s3")
-        dynamodb_client = boto3.client("dynamodb")
+        for flag_id in range(len(flags) - 1):
+            flags[flag_id]["weight"] = flag_id + 1
 
-        s3_bucket = str(uuid.uuid1())
-        s3_prefix = str(uuid.uuid1()) + "/" + str(uuid.uuid1())
-        s3_client.create_bucket(Bucket=s3_bucket)
+        if indices is not None:
+            flags = [flags[i] for i in indices]
 
-        flags_table = str(uuid.uuid1())
-        dynamodb_client.create_table(
-            TableName=flags_table,
-            AttributeDefinitions=[{
-                "AttributeName": "flag",
-                "AttributeType": "S"
-            }],
-            KeySchema=[{
-                "AttributeName": "flag",
-                "KeyType": "HASH"
-            }],
-            ProvisionedThroughput={
-                "ReadCapacityUnits": 1,
-                "WriteCapacityUnits": 1
-            })
-        flags = self.populate_flags(flags_table)
+        if table_name is not None:
+            flags_table = cls.ddb_resource.Table(table_name)
+            with flags_table.batch_writer() as writer:
+                for flag in flags:
+                    writer.put_item(Item=flag)
 
-        return {
-            "KeyValueS3Bucket": s3_bucket,
-            "KeyValueS3Prefix": s3_prefix,
-            "FlagsTable": flags_table,
-            "KeyValueBackend": "S3",
-            "Flags": flags
-        }
+        return flags
 
-    def setup_dynamodb_backend(self):
+    @classmethod
+    def setup_dynamodb_backend(cls):
         """
         Create the AWS resources for a DynamoDB key-value backend, and return
-        the event body template
+        the event body template. The scores table is only named, not created,
+        if the class doesn't need it.
         """
-        dynamodb_client = boto3.client("dynamodb")
+        dynamodb_client = cls.ddb_resource.meta.client
 
-        flags_table = str(uuid.uuid1())
-        scores_table = str(uuid.uuid1())
+        flags_table = str(uuid.uuid4())
+        scores_table = str(uuid.uuid4())
 
         dynamodb_client.create_table(
             TableName=flags_table,
@@ -189,22 +256,23 @@ class ScoreCardTest(unittest.TestCase):
                 "ReadCapacityUnits": 1,
                 "WriteCapacityUnits": 1
             })
-        flags = self.populate_flags(flags_table)
-
-        dynamodb_client.create_table(
-            TableName=scores_table,
-            AttributeDefinitions=[{
-                "AttributeName": "team",
-                "AttributeType": "N"
-            }],
-            KeySchema=[{
-                "AttributeName": "team",
-                "KeyType": "HASH"
-            }],
-            ProvisionedThroughput={
-                "ReadCapacityUnits": 1,
-                "WriteCapacityUnits": 1
-            })
+        flags = cls.populate_flags(flags_table, indices=cls.flag_indices)
+
+        if cls.create_scores:
+            dynamodb_client.create_table(
+                TableName=scores_table,
+                AttributeDefinitions=[{
+                    "AttributeName": "team",
+                    "AttributeType": "N"
+                }],
+                KeySchema=[{
+                    "AttributeName": "team",
+                    "KeyType": "HASH"
+                }],
+                ProvisionedThroughput={
+                    "ReadCapacityUnits": 1,
+                    "WriteCapacityUnits": 1
+                })
 
         return {
             "ScoresTable": scores_table,
@@ -213,484 +281,416 @@ class ScoreCardTest(unittest.TestCase):
             "Flags": flags
         }
 
-    def setUp(self):
+    def reset_tables(self):
         """
-        Create up a new moto context and S3 bucket for each test to ensure no
-        clobbering occurs.
+        Remove any scores claimed by a previous test, and any flags that a
+        previous test added, so that each test starts from the freshly populated
+        tables.
         """
-        reload(ScoreCardSubmit)
-        reload(ScoreCardTally)
-        self.mocks = [moto.mock_s3(), moto.mock_dynamodb2()]
-        for mock in self.mocks:
-            mock.start()
-        self.ddb_event = self.setup_dynamodb_backend()
-        # self.s3_event = self.setup_s3_backend()
+        event = self.class_ddb_event
+        if self.create_scores:
+            scores_table = self.ddb_resource.Table(event["ScoresTable"])
+            with scores_table.batch_writer() as writer:
+                for item in scores_table.scan()["Items"]:
+                    writer.delete_item(Key={"team": item["team"]})
 
-        self.events = [
-            self.ddb_event,
-            # self.s3_event
-        ]
+        flag_ids = set([flag["flag"] for flag in event["Flags"]])
+        flags_table = self.ddb_resource.Table(event["FlagsTable"])
+        with flags_table.batch_writer() as writer:
+            for item in flags_table.scan()["Items"]:
+                if item["flag"] not in flag_ids:
+                    writer.delete_item(Key={"flag": item["flag"]})
 
-    def tearDown(self):
+    def setUp(self):
         """
-        Dispose of the S3 client and table after each test.
+        Reset the modules under test to clear their caches, point them at a fake
+        clock, reset the shared tables, and give each test its own copy of the
+        event body template to ensure no clobbering occurs.
         """
-        for mock in self.mocks:
-            mock.stop()
-        self.mocks = None
+        ScoreCardSubmit.reset_module_state()
+        ScoreCardTally.reset_module_state()
+        self.clock = FakeClock()
+        for module in (ScoreCardSubmit, ScoreCardTally):
+            self.addCleanup(setattr, module, "time", module.time)
+            module.time = self.clock
+        self.reset_tables()
+        self.event = dict(self.class_ddb_event)
 
 
-class BackendTest(ScoreCardTest):
+class InputValidationTests(ScoreCardTest):
     """
-    Test the S3 Key-Value backend for correctness using moto for local mocking
+    Test that malformed requests are rejected. None of these claim a real flag
+    or get as far as the scores table, so the flags table is left empty and no
+    scores table is created.
     """
 
-    # def test_submit_backend_swap(self):
-    #     """
-    #     Cofirm that the submission backend switches when different events are provided.
-    #     """
-    #     self.ddb_event["team"] = str(10)
-    #     self.ddb_event["flag"] = ""
-    #     ScoreCardSubmit.lambda_handler(self.ddb_event, None)
-    #     helpful_assert_equal(ScoreCardSubmit.BACKEND_TYPE, "DynamoDB")
-    #     assert not isinstance(ScoreCardSubmit.SCORES_TABLE,
-    #                           type(ScoreCardSubmit.S3Table))
-    #     self.s3_event["team"] = str(10)
-    #     self.s3_event["flag"] = ""
-    #     ScoreCardSubmit.lambda_handler(self.s3_event, None)
-    #     helpful_assert_equal(ScoreCardSubmit.BACKEND_TYPE, "S3")
-    #     assert isinstance(ScoreCardSubmit.SCORES_TABLE,
-    #                       ScoreCardSubmit.S3Table)
-    #     ScoreCardSubmit.lambda_handler(self.ddb_event, None)
-    #     helpful_assert_equal(ScoreCardSubmit.BACKEND_TYPE, "DynamoDB")
-    #     assert not isinstance(ScoreCardSubmit.SCORES_TABLE,
-    #                           type(ScoreCardSubmit.S3Table))
-
-    def test_missing_arguments(self):
-        """
-        Assert that lack of "team" AND "flag" results in a client_error with two errors
-        """
-        for event in self.events:
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            assert "client_error" in res
-            helpful_assert_equal(len(res["client_error"]), 2)
-
-    def test_missing_argument(self):
-        """
-        Assert that lack of "team" OR "flag" results in a client_error
-        """
-        for event in self.events:
-            event["team"] = str(10)
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            assert "client_error" in res
-            helpful_assert_equal(len(res["client_error"]), 1)
-            del event["team"]
-            event["flag"] = ""
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            assert "client_error" in res
-            helpful_assert_equal(len(res["client_error"]), 1)
-
-    def test_nonintegral_team(self):
-        """
-        Assert that the team must be integral (or parsable as integral)
-        """
-        for event in self.events:
-            event["team"] = "abcde"
-            event["flag"] = ""
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            assert "client_error" in res
-            helpful_assert_equal(len(res["client_error"]), 1)
+    flag_indices = []
+    create_scores = False
 
-    def test_integral_team(self):
+    def test_submit_validation(self):
         """
-        Assert that the team can be integral
+        Assert that a missing "team" or "flag", or a team that isn't integral (or
+        parsable as integral), results in a client_error with one error per
+        problem, and that a well formed claim of a nonexistent flag is rejected.
         """
-        for event in self.events:
-            event["team"] = str(10)
-            event["flag"] = ""
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            assert "client_error" not in res
+        event = self.event
+        for name, fields, n_errors in SUBMIT_VALIDATION_CASES:
+            case_event = dict(event)
+            case_event.update(fields)
+            res = ScoreCardSubmit.lambda_handler(case_event, None)
+            if n_errors > 0:
+                self.assertIn("client_error", res, name)
+                self.assertEqual(len(res["client_error"]), n_errors, name)
+            else:
+                self.assertEqual(res, {"valid_flag": False}, name)
 
-    def test_integral_string_team(self):
+    def test_tally_input1(self):
         """
-        Assert that the team can be a parsable integer
+        Assert that lack of "team" results in a client_error
         """
-        for event in self.events:
-            event["team"] = "10"
-            event["flag"] = ""
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            assert "client_error" not in res
+        event = self.event
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        assert "client_error" in res
+        self.assertEqual(len(res["client_error"]), 1)
 
-    def test_invalid_flag(self):
+    def test_tally_input2(self):
         """
-        Attempt to claim a nonexistent flag
+        Assert that the team must be integral (or parsable as integral)
         """
-        for event in self.events:
-            event["team"] = str(10)
-            event["flag"] = ""
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {"valid_flag": False})
+        event = self.event
+        event["team"] = "abcde"
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        assert "client_error" in res
+        self.assertEqual(len(res["client_error"]), 1)
 
-    def test_durable_flag(self):
-        """
-        A simple durable flag
-        """
-        for event in self.events:
-            flags = event["Flags"]
-            event["team"] = str(randint(10**35, 10**36))
-            event["flag"] = flags[0]["flag"]
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {"valid_flag": True})
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 1.0,
-                "bitmask": [True] + [False] * (len(flags) - 1)
-            })
 
-    def test_score_cache_lifetime_precision(self):
-        """
-        Ensure that the score caching is timely and tight.
-        """
-        for event in self.events:
-            for cache_lifetime in [0, 1, 2, 3, 4, 5]:
-                reload(ScoreCardSubmit)
-                reload(ScoreCardTally)
-                flags = event["Flags"]
-                event["team"] = str(randint(10**35, 10**36))
-                event["flag"] = flags[0]["flag"]
-                event["ScoreCacheLifetime"] = cache_lifetime
-                t0 = time.time()
-                res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-                helpful_assert_equal(
-                    res, {
-                        "team": event["team"],
-                        "score": 0.0,
-                        "bitmask": [False] * len(flags)
-                    })
-                res = ScoreCardSubmit.lambda_handler(
-                    copy.deepcopy(event), None)
-                helpful_assert_equal(res, {"valid_flag": True})
-                while True:
-                    time.sleep(0.05)
-                    res = ScoreCardTally.lambda_handler(
-                        copy.deepcopy(event), None)
-                    if res["score"] != 0:
-                        break
-                cache_delay = time.time() - t0
-                assert cache_delay > cache_lifetime
-                # assert (cache_delay - cache_lifetime) < 1.0
+class BackendTest(ScoreCardTest):
+    """
+    Test the S3 Key-Value backend for correctness using moto for local mocking
+    """
 
-    def test_flag_cache_lifetime_precision(self):
+    def test_durable_flag(self):
         """
-        Ensure that the flag caching is timely and tight
+        A simple durable flag
         """
-        ddb_resource = boto3.resource("dynamodb")
-        for event in self.events:
-            tbl = ddb_resource.Table(event["FlagsTable"])
-            for cache_lifetime in [0, 1, 2, 3, 4, 5]:
-                reload(ScoreCardSubmit)
-                reload(ScoreCardTally)
-
-                # For this flag, we need to know where in the bitmask it will be, relative to the
-                # other flag UUID strings. By setting it to this, we know it'll always be at the end
-                flag = "ffffffff-ffff-ffff-ffff-ffffffffffff"
-
-                event["team"] = str(randint(10**35, 10**36))
-                event["flag"] = flag
-                event["FlagCacheLifetime"] = cache_lifetime
-                event["ScoreCacheLifetime"] = 0
-
-                # To ensure that flags table is in a predictable state at the start of each round,
-                # ensure that the flag we're using doesn't have a row in it. Deleting the row before
-                # it exists (on the first iteration) isn't an issue.
-                tbl.delete_item(Key={"flag": flag})
-
-                # Submit the not-yet-existent flag, to put the flags into the submission cache
-                # Tally the score to put the flags into the tally cache
-                # Put the flag into the Flags table.
-                # Spin, submitting and tallying until the flag registers, and the score registers
-                t0 = time.time()
-                res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-                helpful_assert_equal(res, {
-                    "team": event["team"],
-                    "score": 0.0,
-                    "bitmask": [False] * (len(event["Flags"]))
-                })
-                res = ScoreCardSubmit.lambda_handler(
-                    copy.deepcopy(event), None)
-                helpful_assert_equal(res, {"valid_flag": False})
-
-                tbl.put_item(Item={"flag": flag, "weight": Decimal(1)})
-
-                while True:
-                    time.sleep(0.05)
-                    res = ScoreCardSubmit.lambda_handler(
-                        copy.deepcopy(event), None)
-                    if res["valid_flag"]:
-                        break
-
-                res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-                helpful_assert_equal(
-                    res, {
-                        "team": event["team"],
-                        "score": 1.0,
-                        "bitmask": ([False] * len(event["Flags"])) + [True]
-                    })
-
-                cache_delay = time.time() - t0
-                assert cache_delay > cache_lifetime
-                # assert (cache_delay - cache_lifetime) < 1.0
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(random_team_id())
+        event["flag"] = flags[0]["flag"]
+        res = ScoreCardSubmit.lambda_handler(dict(event), None)
+        self.assertEqual(res, {"valid_flag": True})
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 1.0,
+            "bitmask": [True] + [False] * (len(flags) - 1)
+        })
 
     def test_auth_flag1(self):
         """
         Confirm that the wrong team cannot claim an authorized flag without a key
         """
-        for event in self.events:
-            flags = event["Flags"]
-            event["team"] = str(randint(10**35, 10**36))
-            event["flag"] = flags[1]["flag"]
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {"valid_flag": False})
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(random_team_id())
+        event["flag"] = flags[1]["flag"]
+        res = ScoreCardSubmit.lambda_handler(dict(event), None)
+        self.assertEqual(res, {"valid_flag": False})
 
     def test_auth_flag2(self):
         """
         Confirm that the wrong team cannot claim an authorized flag with the wrong key
         """
-        for event in self.events:
-            flags = event["Flags"]
-            event["team"] = str(randint(10**35, 10**36))
-            event["flag"] = flags[1]["flag"]
-            event["auth_key"] = str(uuid.uuid1())
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {"valid_flag": False})
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(random_team_id())
+        event["flag"] = flags[1]["flag"]
+        event["auth_key"] = str(uuid.uuid4())
+        res = ScoreCardSubmit.lambda_handler(dict(event), None)
+        self.assertEqual(res, {"valid_flag": False})
 
     def test_auth_flag3(self):
         """
         Confirm that the wrong team cannot claim an authorized flag with the right key
         """
-        for event in self.events:
-            flags = event["Flags"]
-            event["team"] = str(randint(10**35, 10**36))
-            event["flag"] = flags[1]["flag"]
-            event["auth_key"] = flags[1]["auth_key"][flags[1]["auth_key"]
-                                                     .keys()[0]]
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {"valid_flag": False})
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(random_team_id())
+        event["flag"] = flags[1]["flag"]
+        event["auth_key"] = next(iter(flags[1]["auth_key"].values()))
+        res = ScoreCardSubmit.lambda_handler(dict(event), None)
+        self.assertEqual(res, {"valid_flag": False})
 
     def test_auth_flag4(self):
         """
         Confirm that the right team and claim the flag with the right key
         """
-        for event in self.events:
-            flags = event["Flags"]
-            event["team"] = str(flags[1]["auth_key"].keys()[0])
-            event["flag"] = flags[1]["flag"]
-            event["auth_key"] = flags[1]["auth_key"][event["team"]]
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {"valid_flag": True})
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(next(iter(flags[1]["auth_key"])))
+        event["flag"] = flags[1]["flag"]
+        event["auth_key"] = flags[1]["auth_key"][event["team"]]
+        res = ScoreCardSubmit.lambda_handler(dict(event), None)
+        self.assertEqual(res, {"valid_flag": True})
 
     def test_auth_flag5(self):
         """
         Confirm that the right team cannot claim the flag with the wrong key
         """
-        for event in self.events:
-            # A durable flag with an auth key for one team as the right team with the wrong key
-            flags = event["Flags"]
-            event["team"] = str(flags[1]["auth_key"].keys()[0])
-            event["flag"] = flags[1]["flag"]
-            event["auth_key"] = str(uuid.uuid1())
-            res = ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {"valid_flag": False})
-
-    # def test_tally_backend_swap(self):
-    #     """
-    #     Cofirm that the submission backend switches when different events are provided.
-    #     """
-    #     self.ddb_event["team"] = str(10)
-    #     self.ddb_event["flag"] = ""
-    #     ScoreCardTally.lambda_handler(self.ddb_event, None)
-    #     helpful_assert_equal(ScoreCardTally.BACKEND_TYPE, "DynamoDB")
-    #     assert not isinstance(ScoreCardTally.SCORES_TABLE,
-    #                           type(ScoreCardTally.S3Table))
-    #     self.s3_event["team"] = str(10)
-    #     self.s3_event["flag"] = ""
-    #     ScoreCardTally.lambda_handler(self.s3_event, None)
-    #     helpful_assert_equal(ScoreCardTally.BACKEND_TYPE, "S3")
-    #     assert isinstance(ScoreCardTally.SCORES_TABLE, ScoreCardTally.S3Table)
-    #     ScoreCardTally.lambda_handler(self.ddb_event, None)
-    #     helpful_assert_equal(ScoreCardTally.BACKEND_TYPE, "DynamoDB")
-    #     assert not isinstance(ScoreCardTally.SCORES_TABLE,
-    #                           type(ScoreCardTally.S3Table))
-
-    def test_tally_input1(self):
-        """
-        Assert that lack of "team" results in a client_error
-        """
-        for event in self.events:
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            assert "client_error" in res
-            helpful_assert_equal(len(res["client_error"]), 1)
-
-    def test_tally_input2(self):
-        """
-        Assert that the team must be integral (or parsable as integral)
-        """
-        for event in self.events:
-            event["team"] = "abcde"
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            assert "client_error" in res
-            helpful_assert_equal(len(res["client_error"]), 1)
+        event = self.event
+        # A durable flag with an auth key for one team as the right team with the wrong key
+        flags = event["Flags"]
+        event["team"] = str(next(iter(flags[1]["auth_key"])))
+        event["flag"] = flags[1]["flag"]
+        event["auth_key"] = str(uuid.uuid4())
+        res = ScoreCardSubmit.lambda_handler(dict(event), None)
+        self.assertEqual(res, {"valid_flag": False})
 
     def test_tally_default_score(self):
         """
         Confirm that the team score without flags claimed is 0
         """
-        for event in self.events:
-            event["team"] = str(randint(10**35, 10**36))
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 0.0,
-                "bitmask": [False] * len(event["Flags"])
-            })
+        event = self.event
+        event["team"] = str(random_team_id())
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 0.0,
+            "bitmask": [False] * len(event["Flags"])
+        })
 
     def test_tally_simple_cached(self):
         """
         Claim a simple durable flag, and fetch the scorefrom cache
         """
-        for event in self.events:
-            flags = event["Flags"]
-            event["team"] = str(randint(10**35, 10**36))
-            event["flag"] = flags[0]["flag"]
-            event["ScoreCacheLifetime"] = 10
-
-            bitmask = [(event["flag"] == eflag["flag"]) for eflag in event["Flags"]]
-
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 0.0,
-                "bitmask": [False] * len(bitmask)
-            })
-            ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 0.0,
-                "bitmask": [False] * len(bitmask)
-            })
-
-            # Override the team score cache to get real-time updates on scores
-            event["ScoreCacheLifetime"] = 0
-
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 1.0,
-                "bitmask": bitmask
-            })
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(random_team_id())
+        event["flag"] = flags[0]["flag"]
+        event["ScoreCacheLifetime"] = 10
+
+        bitmask = self.flag_bitmasks[0]
+
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 0.0,
+            "bitmask": [False] * len(bitmask)
+        })
+        ScoreCardSubmit.lambda_handler(dict(event), None)
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 0.0,
+            "bitmask": [False] * len(bitmask)
+        })
+
+        # Override the team score cache to get real-time updates on scores
+        event["ScoreCacheLifetime"] = 0
+
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 1.0,
+            "bitmask": bitmask
+        })
 
     def test_tally_revocable_alive1(self):
         """
         A simple recovable-alive flag, "yes" unspecified
         """
-        for event in self.events:
-            flags = event["Flags"]
-            event["team"] = str(randint(10**35, 10**36))
-            event["flag"] = flags[2]["flag"]
-            event["ScoreCacheLifetime"] = 0
-
-            bitmask = [(event["flag"] == eflag["flag"])
-                       for eflag in event["Flags"]]
-
-            ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 3.0,
-                "bitmask": bitmask
-            })
-            time.sleep(1.5 * float(flags[2]["timeout"]))
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 0.0,
-                "bitmask": [False] * len(bitmask)
-            })
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(random_team_id())
+        event["flag"] = flags[2]["flag"]
+        event["ScoreCacheLifetime"] = 0
+
+        bitmask = self.flag_bitmasks[2]
+
+        ScoreCardSubmit.lambda_handler(dict(event), None)
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 3.0,
+            "bitmask": bitmask
+        })
+        self.clock.advance(1.5 * float(flags[2]["timeout"]))
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 0.0,
+            "bitmask": [False] * len(bitmask)
+        })
 
     def test_tally_revocable_alive2(self):
         """
         A simple recovable-alive flag, "yes" set to TRUE
         """
-        for event in self.events:
-            flags = event["Flags"]
-            event["team"] = str(randint(10**35, 10**36))
-            event["flag"] = flags[4]["flag"]
-            event["ScoreCacheLifetime"] = 0
-
-            bitmask = [(event["flag"] == eflag["flag"]) for eflag in event["Flags"]]
-
-            ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 5.0,
-                "bitmask": bitmask
-            })
-            time.sleep(1.5 * float(flags[4]["timeout"]))
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 0.0,
-                "bitmask": [False] * len(bitmask)
-            })
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(random_team_id())
+        event["flag"] = flags[4]["flag"]
+        event["ScoreCacheLifetime"] = 0
+
+        bitmask = self.flag_bitmasks[4]
+
+        ScoreCardSubmit.lambda_handler(dict(event), None)
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 5.0,
+            "bitmask": bitmask
+        })
+        self.clock.advance(1.5 * float(flags[4]["timeout"]))
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 0.0,
+            "bitmask": [False] * len(bitmask)
+        })
 
     def test_tally_revocable_dead1(self):
         """
         A simple recovable-dead flag
         """
-        for event in self.events:
-            flags = event["Flags"]
-            event["team"] = str(randint(10**35, 10**36))
-            event["flag"] = flags[6]["flag"]
-            event["ScoreCacheLifetime"] = 0
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(random_team_id())
+        event["flag"] = flags[6]["flag"]
+        event["ScoreCacheLifetime"] = 0
+
+        bitmask = self.flag_bitmasks[6]
+
+        ScoreCardSubmit.lambda_handler(dict(event), None)
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 0.0,
+            "bitmask": [False] * len(bitmask)
+        })
+        self.clock.advance(1.5 * float(flags[6]["timeout"]))
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 7.0,
+            "bitmask": bitmask
+        })
+
+    def test_unweighted_flag(self):
+        """
+        A simple durable flag without a weight
+        """
+        event = self.event
+        flags = event["Flags"]
+        event["team"] = str(random_team_id())
+        event["flag"] = flags[-1]["flag"]
+        event["ScoreCacheLifetime"] = 0
 
-            bitmask = [(event["flag"] == eflag["flag"]) for eflag in event["Flags"]]
+        ScoreCardSubmit.lambda_handler(dict(event), None)
+        res = ScoreCardTally.lambda_handler(dict(event), None)
+        self.assertEqual(res, {
+            "team": event["team"],
+            "score": 0.0,
+            "bitmask": [False] * len(event["Flags"])
+        })
 
 
-            ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 0.0,
-                "bitmask": [False] * len(bitmask)
-            })
-            time.sleep(1.5 * float(flags[6]["timeout"]))
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
-                "team": event["team"],
-                "score": 7.0,
-                "bitmask": bitmask
-            })
+class CacheTimingTests(ScoreCardTest):
+    """
+    Test the cache lifetimes by advancing the fake clock to either side of the
+    moment each cache expires.
+    """
 
-    def test_unweighted_flag(self):
+    def test_score_cache_lifetime_precision(self):
         """
-        A simple durable flag without a weight
+        Ensure that the score caching is timely and tight.
         """
-        for event in self.events:
+        event = self.event
+        for cache_lifetime in [0, 2, 5]:
+            ScoreCardSubmit.reset_module_state()
+            ScoreCardTally.reset_module_state()
             flags = event["Flags"]
-            event["team"] = str(randint(10**35, 10**36))
-            event["flag"] = flags[-1]["flag"]
+            event["team"] = str(random_team_id())
+            event["flag"] = flags[0]["flag"]
+            event["ScoreCacheLifetime"] = cache_lifetime
+            res = ScoreCardTally.lambda_handler(dict(event), None)
+            self.assertEqual(
+                res, {
+                    "team": event["team"],
+                    "score": 0.0,
+                    "bitmask": [False] * len(flags)
+                })
+            res = ScoreCardSubmit.lambda_handler(
+                dict(event), None)
+            self.assertEqual(res, {"valid_flag": True})
+
+            # Just before the cached score expires, it is still served.
+            if cache_lifetime > 0:
+                self.clock.advance(cache_lifetime - 0.001)
+                res = ScoreCardTally.lambda_handler(dict(event), None)
+                self.assertEqual(res["score"], 0.0)
+
+            self.clock.advance(0.002)
+            res = ScoreCardTally.lambda_handler(dict(event), None)
+            self.assertEqual(res["score"], 1.0)
+
+    def test_flag_cache_lifetime_precision(self):
+        """
+        Ensure that the flag caching is timely and tight
+        """
+        event = self.event
+        tbl = self.ddb_resource.Table(event["FlagsTable"])
+        for cache_lifetime in [0, 2, 5]:
+            ScoreCardSubmit.reset_module_state()
+            ScoreCardTally.reset_module_state()
+
+            # For this flag, we need to know where in the bitmask it will be, relative to the
+            # other flag UUID strings. By setting it to this, we know it'll always be at the end
+            flag = "ffffffff-ffff-ffff-ffff-ffffffffffff"
+
+            event["team"] = str(random_team_id())
+            event["flag"] = flag
+            event["FlagCacheLifetime"] = cache_lifetime
             event["ScoreCacheLifetime"] = 0
 
-            ScoreCardSubmit.lambda_handler(copy.deepcopy(event), None)
-            res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-            helpful_assert_equal(res, {
+            # To ensure that flags table is in a predictable state at the start of each round,
+            # ensure that the flag we're using doesn't have a row in it. Deleting the row before
+            # it exists (on the first iteration) isn't an issue.
+            tbl.delete_item(Key={"flag": flag})
+
+            # Submit the not-yet-existent flag, to put the flags into the submission cache
+            # Tally the score to put the flags into the tally cache
+            # Put the flag into the Flags table.
+            # Step the clock past the cache lifetime, and check the flag and score register
+            res = ScoreCardTally.lambda_handler(dict(event), None)
+            self.assertEqual(res, {
                 "team": event["team"],
                 "score": 0.0,
-                "bitmask": [False] * len(event["Flags"])
+                "bitmask": [False] * (len(event["Flags"]))
             })
+            res = ScoreCardSubmit.lambda_handler(
+                dict(event), None)
+            self.assertEqual(res, {"valid_flag": False})
+
+            tbl.put_item(Item={"flag": flag, "weight": Decimal(1)})
+
+            # Just before the cached flags expire, the new flag is unknown.
+            if cache_lifetime > 0:
+                self.clock.advance(cache_lifetime - 0.001)
+                res = ScoreCardSubmit.lambda_handler(dict(event), None)
+                self.assertEqual(res, {"valid_flag": False})
+
+            self.clock.advance(0.002)
+            res = ScoreCardSubmit.lambda_handler(dict(event), None)
+            self.assertEqual(res, {"valid_flag": True})
+
+            res = ScoreCardTally.lambda_handler(dict(event), None)
+            self.assertEqual(
+                res, {
+                    "team": event["team"],
+                    "score": 1.0,
+                    "bitmask": ([False] * len(event["Flags"])) + [True]
+                })
 
 
 class XraySamplingTests(ScoreCardTest):
@@ -700,46 +700,13 @@ class XraySamplingTests(ScoreCardTest):
 
     def test_binomial(self):
         """
-        Test that the binomial calculation works for Binomial(100, n)
+        Test that the binomial calculation works for Binomial(100, n), using the
+        exact integer coefficients as the reference.
         """
         binomials = [
             reduce(lambda a, b: a * b, binomial_list(100, n))
-            for n in xrange(0, 101)]
-        expected = [
-            1, 100, 4950, 161700, 3921225, 75287520, 1192052400, 16007560800,
-            186087894300, 1902231808400, 17310309456440, 141629804643600, 1050421051106700,
-            7110542499799200, 44186942677323600, 253338471349988640, 1345860629046814650,
-            6650134872937201800, 30664510802988208300, 132341572939212267400,
-            535983370403809682970, 2041841411062132125600, 7332066885177656269200,
-            24865270306254660391200, 79776075565900368755100, 242519269720337121015504,
-            699574816500972464467800, 1917353200780443050763600, 4998813702034726525205100,
-            12410847811948286545336800, 29372339821610944823963760, 66324638306863423796047200,
-            143012501349174257560226775, 294692427022540894366527900, 580717429720889409486981450,
-            1095067153187962886461165020, 1977204582144932989443770175,
-            3420029547493938143902737600, 5670048986634686922786117600,
-            9013924030034630492634340800, 13746234145802811501267369720,
-            20116440213369968050635175200, 28258808871162574166368460400,
-            38116532895986727945334202400, 49378235797073715747364762200,
-            61448471214136179596720592960, 73470998190814997343905056800,
-            84413487283064039501507937600, 93206558875049876949581681100,
-            98913082887808032681188722800, 100891344545564193334812497256,
-            98913082887808032681188722800, 93206558875049876949581681100,
-            84413487283064039501507937600, 73470998190814997343905056800,
-            61448471214136179596720592960, 49378235797073715747364762200,
-            38116532895986727945334202400, 28258808871162574166368460400,
-            20116440213369968050635175200, 13746234145802811501267369720,
-            9013924030034630492634340800, 5670048986634686922786117600,
-            3420029547493938143902737600, 1977204582144932989443770175,
-            1095067153187962886461165020, 580717429720889409486981450,
-            294692427022540894366527900, 143012501349174257560226775,
-            66324638306863423796047200, 29372339821610944823963760, 12410847811948286545336800,
-            4998813702034726525205100, 1917353200780443050763600, 699574816500972464467800,
-            242519269720337121015504, 79776075565900368755100, 24865270306254660391200,
-            7332066885177656269200, 2041841411062132125600, 535983370403809682970,
-            132341572939212267400, 30664510802988208300, 6650134872937201800,
-            1345860629046814650, 253338471349988640, 44186942677323600, 7110542499799200,
-            1050421051106700, 141629804643600, 17310309456440, 1902231808400, 186087894300,
-            16007560800, 1192052400, 75287520, 3921225, 161700, 4950, 100, 1]
+            for n in range(0, 101)]
+        expected = [comb(100, n) for n in range(0, 101)]
         max_rel_error = max([abs(float(a - b)) / b for a, b in zip(binomials, expected)])
         assert max_rel_error < 10**-14
 
@@ -747,12 +714,10 @@ class XraySamplingTests(ScoreCardTest):
         """
         Test that the coin-toss simulation is correct for a few select values
         """
-        for i in range(1, 101):
-            helpful_assert_equal(coin_toss(100, i, 0.0), 0.0)
-        helpful_assert_equal(coin_toss(100, 0, 0.0), 1.0)
-        for i in range(0, 100):
-            helpful_assert_equal(coin_toss(100, i, 1.0), 0.0)
-        helpful_assert_equal(coin_toss(100, 100, 1.0), 1.0)
+        self.assertEqual([coin_toss(100, i, 0.0) for i in range(0, 101)],
+                         [1.0] + [0.0] * 100)
+        self.assertEqual([coin_toss(100, i, 1.0) for i in range(0, 101)],
+                         [0.0] * 100 + [1.0])
         assert abs(
             coin_toss(300, 200, 0.75) -
             0.00026617318083780561928702841873999185536747448066193) < 10**-15
@@ -773,9 +738,9 @@ class XraySamplingTests(ScoreCardTest):
         """
         total_probabilities = [
             sum([coin_toss(flip_count, i, fairness)
-                 for i in xrange(0, flip_count + 1)])
-            for fairness in [random() for _ in xrange(10)]
-            for flip_count in [randint(100, 500) for _ in xrange(10)]]
+                 for i in range(0, flip_count + 1)])
+            for fairness in [random() for _ in range(10)]
+            for flip_count in [randint(100, 500) for _ in range(10)]]
         deltas = [abs(p - 1) for p in total_probabilities]
         assert max(deltas) < 10**-14
 
@@ -786,7 +751,7 @@ class XraySamplingTests(ScoreCardTest):
         coin_toss_counts(0.5, 0.45, 0.55)
         coin_toss_counts(0.9, 0.85, 0.95)
         coin_toss_counts(0.1, 0.05, 0.15)
-        helpful_assert_equal(coin_toss_counts(0.0, 0.0, 0.0), 1)
+        self.assertEqual(coin_toss_counts(0.0, 0.0, 0.0), 1)
 
     def test_coin_toss_count2(self):
         """
@@ -811,51 +776,58 @@ class XraySamplingTests(ScoreCardTest):
         """
         Ensure that the if the sampling rate is unspecified, it is not sampled.
         """
-        os.environ["DEBUG"] = "TRUE"
-        for event in self.events:
-            for _ in range(10):
-                event["team"] = str(randint(10**35, 10**36))
-                res = ScoreCardTally.lambda_handler(copy.deepcopy(event), None)
-                assert res["Debug"]["MockedXray"]
-
+        self.addCleanup(setattr, util, "DEBUG", util.DEBUG)
+        util.DEBUG = True
+        event = self.event
+        for _ in range(10):
+            event["team"] = str(random_team_id())
+            res = ScoreCardTally.lambda_handler(event, None)
+            assert res["Debug"]["MockedXray"]
 
     def test_xray_sampling_rate(self):
         """
         Ensure that the rate at which requests are sampled is correct.
+
+        The tally handler doesn't modify its event, so the test's own event is
+        passed in directly, with only the team changing between requests.
+
+        The sampling rate is read from the environment when util is loaded, so
+        it's set on the module directly.
         """
-        os.environ["DEBUG"] = "TRUE"
+        self.addCleanup(setattr, util, "DEBUG", util.DEBUG)
+        self.addCleanup(
+            setattr, util, "XRAY_SAMPLE_RATE", util.XRAY_SAMPLE_RATE)
+        util.DEBUG = True
         test_runs = []
-        for event in self.events:
-            for xsp in [0.0, 0.01, 0.1, 0.5, 1.0]:
-                n_events = max(
-                    25,
-                    coin_toss_counts(
-                        xsp,
-                        max(0.0, xsp - 0.05),
-                        min(1.0, xsp + 0.05), 0.95)
-                )
-                n_mocked = 0
-                os.environ["XraySampleRate"] = str(xsp)
-                tally_times = []
-                for _ in xrange(
-                        n_events):  # Tally the scores of N teams.
-                    t_0 = time.time()
-                    event["team"] = str(randint(10**35, 10**36))
-                    res = ScoreCardTally.lambda_handler(
-                        copy.deepcopy(event), None)
-                    if res["Debug"]["MockedXray"]:
-                        n_mocked += 1
-                    t_1 = time.time()
-                    tally_times.append(t_1 - t_0)
-                if xsp == 0.0:
-                    helpful_assert_equal(n_mocked, n_events)
-                elif xsp == 1.0:
-                    helpful_assert_equal(n_mocked, 0)
-                else:
-                    test_runs.append((
-                        max(0.0, xsp - 0.05),
-                        n_events, n_mocked,
-                        min(1.0, xsp + 0.05)))
+        event = self.event
+        for xsp in [0.0, 0.01, 0.1, 0.5, 1.0]:
+            n_events = max(
+                25,
+                coin_toss_counts(
+                    xsp,
+                    max(0.0, xsp - 0.05),
+                    min(1.0, xsp + 0.05), 0.95)
+            )
+            n_mocked = 0
+            util.XRAY_SAMPLE_RATE = xsp
+            tally_times = []
+            for _ in range(n_events):  # Tally the scores of N teams.
+                t_0 = perf_counter()
+                event["team"] = str(random_team_id())
+                res = ScoreCardTally.lambda_handler(event, None)
+                if res["Debug"]["MockedXray"]:
+                    n_mocked += 1
+                t_1 = perf_counter()
+                tally_times.append(t_1 - t_0)
+            if xsp == 0.0:
+                self.assertEqual(n_mocked, n_events)
+            elif xsp == 1.0:
+                self.assertEqual(n_mocked, 0)
+            else:
+                test_runs.append((
+                    max(0.0, xsp - 0.05),
+                    n_events, n_mocked,
+                    min(1.0, xsp + 0.05)))
         # Since there were a total of 10 tests run with 6 logged, each wth a
         # 95% chance of succeeding. The probability of >= 3 succeeding is 99.7%
         test_results = [
@@ -865,9 +837,6 @@ class XraySamplingTests(ScoreCardTest):
         n_passed = len([result for result in test_results if result])
         assert n_passed >= 3
 
-        del os.environ["DEBUG"]
-        del os.environ["XraySampleRate"]
-
 
 if __name__ == "__main__":
     unittest.main()
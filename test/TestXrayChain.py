@@ -85,6 +85,35 @@ class XrayChainTests(unittest.TestCase):
         gchild = child.fork_subsegment(parent_id=segment_id)
         assert gchild.parent_id == segment_id
 
+    def test_recursive_flush(self):
+        """
+        Ensure that a recursive flush takes the segments from every chain in the
+        tree, and leaves nothing behind to flush again.
+        """
+        chain = XrayChain.Chain(mock=True)
+        chain.log(0, 1, "RootEvent")
+        child = chain.fork_subsegment()
+        child.log(1, 2, "ChildEvent")
+        gchild = child.fork_root()
+        gchild.log(2, 3, "GrandchildEvent")
+        gchild.log(3, 4, "GrandchildEvent")
+        assert chain.recursive_flush() == 4
+        assert chain.recursive_flush() == 0
+        assert gchild.flush() == 0
+
+    def test_null_chain(self):
+        """
+        Ensure that a NullChain forks to itself, leaves traced functions
+        unwrapped, and never has anything to flush.
+        """
+        chain = XrayChain.NullChain()
+        assert chain.fork_root() is chain
+        assert chain.fork_subsegment() is chain
+        assert chain.trace("Event")(len) is len
+        assert chain.trace_associated("Event")(len) is len
+        chain.log_end(chain.log_start("Event"))
+        assert chain.flush() == 0
+
 
 if __name__ == "__main__":
     unittest.main()
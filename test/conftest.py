@@ -0,0 +1,16 @@
+"""
+pytest configuration for running the unit tests in parallel with pytest-xdist:
+
+    pytest -n auto --dist loadscope test/TestScoreCard.py \
+        test/TestS3KeyValueStore.py test/TestXrayChain.py
+
+Each test class shares its moto backend between its tests, so --dist loadscope
+keeps every class on a single worker while the classes are spread across
+workers.
+"""
+
+import os
+import sys
+
+# The modules under test live in the repository root.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,13 @@
+"""
+Helpers shared by the unit and integration tests.
+"""
+
+from random import getrandbits
+
+
+def random_team_id():
+    """
+    Generate a random 36 or 37 digit team ID that is unlikely to collide with an
+    existing team.
+    """
+    return getrandbits(120) | (1 << 119)
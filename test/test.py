@@ -13,18 +13,97 @@ only testing. All tests are integration tests.
 
 from __future__ import print_function
 
-import copy
+import os
 import time
 import uuid
 import argparse
 import traceback
-from random import randint
 from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from helpers import random_team_id
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Client configuration for the integration tests, sized so that concurrent calls
+# don't queue on the default ten pooled connections.
+BOTO_CONFIG = Config(
+    max_pool_connections=32, retries={
+        'max_attempts': 5,
+        'mode': 'adaptive'
+    })
+
+# Request body for a flag claim without an auth key. Team IDs and flag UUIDs
+# never need escaping, so the body can be templated rather than serialized.
+CLAIM_BODY_TEMPLATE = '{"team": "%s", "flag": "%s"}'
+
+# The shape of each flag generated by populate_flags(), as the auth key value
+# for a single random team (if any), whether the flag is revocable, and the
+# value of 'yes' (if specified). Flags are weighted by their position, except
+# for the last.
+FLAG_TEMPLATES = [
+    # A simple durable flag
+    (None, False, None),
+    # A durable flag with an auth key for one team
+    ("1", False, None),
+    # A simple recovable-alive flag, 'yes' unspecified
+    (None, True, None),
+    # A recovable-alive flag with an auth key for one team, 'yes' unspecified
+    ("2", True, None),
+    # A simple recovable-alive flag, 'yes' specified to TRUE
+    (None, True, True),
+    # A recovable-alive flag with an auth key for one team, 'yes' specified to TRUE
+    ("2", True, True),
+    # A simple recovable-dead flag
+    (None, True, False),
+    # A recovable-dead flag with an auth key for one team
+    ("3", True, False),
+    # A simple durable flag that WILL NOT HAVE A WEIGHT
+    (None, False, None),
+]
+
+
+# The boto3 session, clients, and resources shared across the module. These are
+# created on first use, so that they pick up the region configured at startup.
+AWS = {'session': None, 'clients': {}, 'resources': {}}
+
+
+def aws_session():
+    """
+    Return the module's boto3 session, creating it if necessary.
+    """
+    if AWS['session'] is None:
+        AWS['session'] = boto3.Session()
+    return AWS['session']
+
+
+def aws_client(service):
+    """
+    Return the module's boto3 client for the given service, creating it if
+    necessary.
+    """
+    if service not in AWS['clients']:
+        AWS['clients'][service] = aws_session().client(
+            service, config=BOTO_CONFIG)
+    return AWS['clients'][service]
+
+
+def aws_resource(service):
+    """
+    Return the module's boto3 resource for the given service, creating it if
+    necessary.
+    """
+    if service not in AWS['resources']:
+        AWS['resources'][service] = aws_session().resource(
+            service, config=BOTO_CONFIG)
+    return AWS['resources'][service]
+
 
 def helpful_assert_equal(lhs, rhs):
     try:
@@ -36,6 +115,18 @@ def helpful_assert_equal(lhs, rhs):
         raise e
 
 
+def random_uuids(count):
+    """
+    Generate the given number of random (version 4) UUID strings from a single
+    read of random bytes.
+    """
+    raw = os.urandom(16 * count)
+    return [
+        str(uuid.UUID(bytes=raw[i:i + 16], version=4))
+        for i in range(0, 16 * count, 16)
+    ]
+
+
 def update_stack_parameters(stack_name, parameters):
     """
     Perform an in-place update of a CloudFormation stack that replaces only the
@@ -43,8 +134,8 @@ def update_stack_parameters(stack_name, parameters):
     take effect in the body mapping templates.
     """
     print("Updating stack parameters...")
-    cfn_client = boto3.client('cloudformation')
-    api_client = boto3.client('apigateway')
+    cfn_client = aws_client('cloudformation')
+    api_client = aws_client('apigateway')
     try:
         print("Updating stack...")
         cfn_client.update_stack(
@@ -60,9 +151,9 @@ def update_stack_parameters(stack_name, parameters):
         update_waiter.wait(StackName=stack_name)
 
     print("Deploying new API Gateway stage for new parameters...")
-    api_resource = cfn_client.describe_stack_resources(
+    api_resource = cfn_client.describe_stack_resource(
         StackName=stack_name,
-        LogicalResourceId='API')['StackResources'][0]['PhysicalResourceId']
+        LogicalResourceId='API')['StackResourceDetail']['PhysicalResourceId']
     api_client.create_deployment(restApiId=api_resource, stageName='Main')
     print("    Sleeping while new stage deployment propagates...")
     time.sleep(5)
@@ -80,15 +171,16 @@ def integration_tests(stack_name):
     #   cleanup afterwards
     # - Use a collection of teams that are unlikely to be in the table already
     #   to test claiming and tallying the team's scores.
-    cfn_client = boto3.client('cloudformation')
-    ddb_client = boto3.client('dynamodb')
+    cfn_client = aws_client('cloudformation')
+    ddb_client = aws_client('dynamodb')
 
     print("Performing integration tests against stack: %s" % stack_name)
     stack_parameters = cfn_client.describe_stacks(
         StackName=stack_name)['Stacks'][0]['Parameters']
 
     print("Generating cache-free parameters...")
-    cache_free_parameters = copy.deepcopy(stack_parameters)
+    # The parameters are flat dicts of strings, so copying each dict suffices.
+    cache_free_parameters = [dict(p) for p in stack_parameters]
     score_cache = [
         p for p in cache_free_parameters
         if p['ParameterKey'] == 'ScoreCacheLifetime'
@@ -100,22 +192,26 @@ def integration_tests(stack_name):
     ][0]
     flags_cache['ParameterValue'] = '0'
 
-    update_stack_parameters(stack_name, cache_free_parameters)
-    print("Cache parameter update complete")
+    # Each stack update waits on CloudFormation, so skip both the update and the
+    # restoration if the stack is already running without caches.
+    caches_changed = cache_free_parameters != stack_parameters
+    if caches_changed:
+        update_stack_parameters(stack_name, cache_free_parameters)
+        print("Cache parameter update complete")
+    else:
+        print("    Caches already disabled, no stack update necessary")
 
-    api_resource = cfn_client.describe_stack_resources(
-        StackName=stack_name,
-        LogicalResourceId='API')['StackResources'][0]['PhysicalResourceId']
-    flags_table_name = cfn_client.describe_stack_resources(
-        StackName=stack_name, LogicalResourceId='FlagsTable')[
-            'StackResources'][0]['PhysicalResourceId']
+    # Fetch the physical IDs of all of the stack's resources in one pass.
+    stack_resources = dict()
+    paginator = cfn_client.get_paginator('list_stack_resources')
+    for page in paginator.paginate(StackName=stack_name):
+        for resource in page['StackResourceSummaries']:
+            stack_resources[resource['LogicalResourceId']] = resource[
+                'PhysicalResourceId']
 
-    try:
-        scores_table_name = cfn_client.describe_stack_resources(
-            StackName=stack_name, LogicalResourceId='ScoresTable')[
-                'StackResources'][0]['PhysicalResourceId']
-    except IndexError:
-        scores_table_name = None
+    api_resource = stack_resources['API']
+    flags_table_name = stack_resources['FlagsTable']
+    scores_table_name = stack_resources.get('ScoresTable', None)
 
     if [p for p in stack_parameters if p['ParameterKey'] == 'KeyValueBackend'
         ][0]['ParameterValue'] == 'S3':
@@ -125,7 +221,7 @@ def integration_tests(stack_name):
     flags = populate_flags(flags_table_name, 5.0)
 
     api_endpoint = 'https://%s.execute-api.%s.amazonaws.com/Main' % (
-        api_resource, boto3.Session().region_name)
+        api_resource, aws_session().region_name)
 
     print("Setup successful")
 
@@ -135,40 +231,68 @@ def integration_tests(stack_name):
 
     flags_record = []
 
+    # Reuse connections to the API across requests, and make the independent
+    # requests for different teams concurrently. Assertions stay serial.
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
+    pool = ThreadPoolExecutor(max_workers=16)
+
+    def get_score(team):
+        return session.get(url=api_endpoint + "/score/" + str(team))
+
+    flag_url = api_endpoint + "/flag"
+
+    def post_claim(body):
+        return session.post(url=flag_url, data=body, headers=JSON_HEADERS)
+
+    def post_flag(record):
+        return session.post(url=flag_url, json=record, headers=JSON_HEADERS)
+
+    def wait_for_score(score_url, score, timeout):
+        # A revocable flag can't change state until its timeout has passed
+        # since the claim, so wait that long and then poll for the new score
+        # until 1.5 times the timeout has passed.
+        deadline = time.time() + 1.5 * timeout
+        time.sleep(timeout)
+        resp = session.get(url=score_url)
+        while resp.json().get('score') != score and time.time() < deadline:
+            time.sleep(0.25)
+            resp = session.get(url=score_url)
+        return resp
+
     print("Running tests...")
     try:
         print("    Assert that a team's default score is 0")
-        for team in [randint(10**35, 10**36) for _ in range(2)]:
-            resp = requests.get(url=api_endpoint + "/score/" + str(team))
+        teams = [random_team_id() for _ in range(2)]
+        for team, resp in zip(teams, pool.map(get_score, teams)):
             helpful_assert_equal(resp.json(), {
                 'score': 0.0,
                 'team': str(team)
             })
 
         print("    Assert that each team cannot claim a non-existent flag")
-        for team in [randint(10**35, 10**36) for _ in range(2)]:
-            record = {'team': str(team), 'flag': str(uuid.uuid1())}
-            flags_record.append(record)
-            resp = requests.post(
-                url=api_endpoint + "/flag",
-                json=record,
-                headers={
-                    'Content-Type': 'application/json'
-                })
+        records = [{
+            'team': str(team),
+            'flag': str(uuid.uuid4())
+        } for team in [random_team_id() for _ in range(2)]]
+        flags_record.extend(records)
+        bodies = [
+            CLAIM_BODY_TEMPLATE % (record['team'], record['flag'])
+            for record in records
+        ]
+        for resp in pool.map(post_claim, bodies):
             helpful_assert_equal(resp.json(), {'valid_flag': False})
 
         print("    Assert that each team can claim a durable simple flag.")
-        for team in [randint(10**35, 10**36) for _ in range(2)]:
-            record = {'team': str(team), 'flag': flags[0]['flag']}
-            flags_record.append(record)
-            resp = requests.post(
-                url=api_endpoint + "/flag",
-                json=record,
-                headers={
-                    'Content-Type': 'application/json'
-                })
+        # Only the team changes between these claims, so fill in the flag once.
+        durable_body_template = CLAIM_BODY_TEMPLATE % ('%s', flags[0]['flag'])
+        teams = [random_team_id() for _ in range(2)]
+        flags_record.extend(
+            [{'team': str(team), 'flag': flags[0]['flag']} for team in teams])
+        bodies = [durable_body_template % team for team in teams]
+        for resp in pool.map(post_claim, bodies):
             helpful_assert_equal(resp.json(), {'valid_flag': True})
-            resp = requests.get(url=api_endpoint + "/score/" + str(team))
+        for team, resp in zip(teams, pool.map(get_score, teams)):
             helpful_assert_equal(resp.json(), {
                 'score': 1.0,
                 'team': str(team)
@@ -177,81 +301,71 @@ def integration_tests(stack_name):
         print(
             "    Assert that an authenticated flag can only be claimed by the right team"
         )
+        # Each authenticated flag has a key for exactly one team.
+        auth_team, auth_val = next(iter(flags[1]['auth_key'].items()))
         print("      Right team wrong key...")
         record = {
-            'team': list(flags[1]['auth_key'].keys())[0],
+            'team': auth_team,
             'auth_key': "",
             'flag': flags[1]['flag']
         }
         flags_record.append(record)
-        resp = requests.post(
-            url=api_endpoint + "/flag",
-            json=record,
-            headers={
-                'Content-Type': 'application/json'
-            })
+        team_s = str(record['team'])
+        score_url = api_endpoint + "/score/" + team_s
+        resp = post_flag(record)
         helpful_assert_equal(resp.json(), {'valid_flag': False})
-        resp = requests.get(url=api_endpoint + "/score/" + str(record['team']))
+        resp = session.get(url=score_url)
         helpful_assert_equal(resp.json(), {
             'score': 0.0,
-            'team': str(record['team'])
+            'team': team_s
         })
         print("      Right team right key...")
         record = {
-            'team': list(flags[1]['auth_key'].keys())[0],
-            'auth_key': list(flags[1]['auth_key'].values())[0],
+            'team': auth_team,
+            'auth_key': auth_val,
             'flag': flags[1]['flag']
         }
         flags_record.append(record)
-        resp = requests.post(
-            url=api_endpoint + "/flag",
-            json=record,
-            headers={
-                'Content-Type': 'application/json'
-            })
+        team_s = str(record['team'])
+        score_url = api_endpoint + "/score/" + team_s
+        resp = post_flag(record)
         helpful_assert_equal(resp.json(), {'valid_flag': True})
-        resp = requests.get(url=api_endpoint + "/score/" + str(record['team']))
+        resp = session.get(url=score_url)
         helpful_assert_equal(resp.json(), {
             'score': 2.0,
-            'team': str(record['team'])
+            'team': team_s
         })
         print("      Wrong team right key...")
         record = {
-            'team': randint(10**35, 10**36),
-            'auth_key': list(flags[1]['auth_key'].values())[0],
+            'team': random_team_id(),
+            'auth_key': auth_val,
             'flag': flags[1]['flag']
         }
         flags_record.append(record)
-        resp = requests.post(
-            url=api_endpoint + "/flag",
-            json=record,
-            headers={
-                'Content-Type': 'application/json'
-            })
+        team_s = str(record['team'])
+        score_url = api_endpoint + "/score/" + team_s
+        resp = post_flag(record)
         helpful_assert_equal(resp.json(), {'valid_flag': False})
-        resp = requests.get(url=api_endpoint + "/score/" + str(record['team']))
+        resp = session.get(url=score_url)
         helpful_assert_equal(resp.json(), {
             'score': 0.0,
-            'team': str(record['team'])
+            'team': team_s
         })
         print("      Wrong team wrong key...")
         record = {
-            'team': randint(10**35, 10**36),
+            'team': random_team_id(),
             'auth_key': "",
             'flag': flags[1]['flag']
         }
         flags_record.append(record)
-        resp = requests.post(
-            url=api_endpoint + "/flag",
-            json=record,
-            headers={
-                'Content-Type': 'application/json'
-            })
+        team_s = str(record['team'])
+        score_url = api_endpoint + "/score/" + team_s
+        resp = post_flag(record)
         helpful_assert_equal(resp.json(), {'valid_flag': False})
-        resp = requests.get(url=api_endpoint + "/score/" + str(record['team']))
+        resp = session.get(url=score_url)
         helpful_assert_equal(resp.json(), {
             'score': 0.0,
-            'team': str(record['team'])
+            'team': team_s
         })
 
         for flag_num in [2, 4]:
@@ -259,145 +373,121 @@ def integration_tests(stack_name):
                 "    Assert that revocable flags tally correctly only within their lifetime."
             )
             record = {
-                'team': randint(10**35, 10**36),
+                'team': random_team_id(),
                 'flag': flags[flag_num]['flag']
             }
             flags_record.append(record)
-            resp = requests.post(
-                url=api_endpoint + "/flag",
-                json=record,
-                headers={
-                    'Content-Type': 'application/json'
-                })
+            team_s = str(record['team'])
+            score_url = api_endpoint + "/score/" + team_s
+            resp = post_flag(record)
             helpful_assert_equal(resp.json(), {'valid_flag': True})
-            resp = requests.get(
-                url=api_endpoint + "/score/" + str(record['team']))
+            resp = session.get(url=score_url)
             helpful_assert_equal(resp.json(), {
                 'score': flag_num + 1.0,
-                'team': str(record['team'])
+                'team': team_s
             })
-            time.sleep(1.5 * float(flags[flag_num]['timeout']))
-            resp = requests.get(
-                url=api_endpoint + "/score/" + str(record['team']))
+            resp = wait_for_score(score_url, 0.0,
+                                  float(flags[flag_num]['timeout']))
             helpful_assert_equal(resp.json(), {
                 'score': 0.0,
-                'team': str(record['team'])
+                'team': team_s
             })
 
             print("    Recovable alive flags with auth keys for the...")
+            auth_team, auth_val = next(
+                iter(flags[flag_num + 1]['auth_key'].items()))
             print("      Right team wrong key")
             record = {
-                'team': list(flags[flag_num + 1]['auth_key'].keys())[0],
+                'team': auth_team,
                 'flag': flags[flag_num + 1]['flag'],
                 'auth_key': "",
             }
             flags_record.append(record)
-            resp = requests.post(
-                url=api_endpoint + "/flag",
-                json=record,
-                headers={
-                    'Content-Type': 'application/json'
-                })
+            team_s = str(record['team'])
+            score_url = api_endpoint + "/score/" + team_s
+            resp = post_flag(record)
             helpful_assert_equal(resp.json(), {'valid_flag': False})
-            resp = requests.get(
-                url=api_endpoint + "/score/" + str(record['team']))
+            resp = session.get(url=score_url)
             helpful_assert_equal(resp.json(), {
                 'score': 0.0,
-                'team': str(record['team'])
+                'team': team_s
             })
 
             print("      Right team right key")
             record = {
-                'team': list(flags[flag_num + 1]['auth_key'].keys())[0],
+                'team': auth_team,
                 'flag': flags[flag_num + 1]['flag'],
-                'auth_key': list(flags[flag_num + 1]['auth_key'].values())[0],
+                'auth_key': auth_val,
             }
             flags_record.append(record)
-            resp = requests.post(
-                url=api_endpoint + "/flag",
-                json=record,
-                headers={
-                    'Content-Type': 'application/json'
-                })
+            team_s = str(record['team'])
+            score_url = api_endpoint + "/score/" + team_s
+            resp = post_flag(record)
             helpful_assert_equal(resp.json(), {'valid_flag': True})
-            resp = requests.get(
-                url=api_endpoint + "/score/" + str(record['team']))
+            resp = session.get(url=score_url)
             helpful_assert_equal(resp.json(), {
                 'score': flag_num + 1 + 1.0,
-                'team': str(record['team'])
+                'team': team_s
             })
-            time.sleep(1.5 * float(flags[flag_num + 1]['timeout']))
-            resp = requests.get(
-                url=api_endpoint + "/score/" + str(record['team']))
+            resp = wait_for_score(score_url, 0.0,
+                                  float(flags[flag_num + 1]['timeout']))
             helpful_assert_equal(resp.json(), {
                 'score': 0.0,
-                'team': str(record['team'])
+                'team': team_s
             })
 
             print("      Wrong team right key")
             record = {
-                'team': randint(10**35, 10**36),
+                'team': random_team_id(),
                 'flag': flags[flag_num + 1]['flag'],
-                'auth_key': list(flags[flag_num + 1]['auth_key'].values())[0],
+                'auth_key': auth_val,
             }
             flags_record.append(record)
-            resp = requests.post(
-                url=api_endpoint + "/flag",
-                json=record,
-                headers={
-                    'Content-Type': 'application/json'
-                })
+            team_s = str(record['team'])
+            score_url = api_endpoint + "/score/" + team_s
+            resp = post_flag(record)
             helpful_assert_equal(resp.json(), {'valid_flag': False})
-            resp = requests.get(
-                url=api_endpoint + "/score/" + str(record['team']))
+            resp = session.get(url=score_url)
             helpful_assert_equal(resp.json(), {
                 'score': 0.0,
-                'team': str(record['team'])
+                'team': team_s
             })
 
             print("      Wrong team wrong key")
             record = {
-                'team': randint(10**35, 10**36),
+                'team': random_team_id(),
                 'flag': flags[flag_num + 1]['flag'],
                 'auth_key': "",
             }
             flags_record.append(record)
-            resp = requests.post(
-                url=api_endpoint + "/flag",
-                json=record,
-                headers={
-                    'Content-Type': 'application/json'
-                })
+            team_s = str(record['team'])
+            score_url = api_endpoint + "/score/" + team_s
+            resp = post_flag(record)
             helpful_assert_equal(resp.json(), {'valid_flag': False})
-            resp = requests.get(
-                url=api_endpoint + "/score/" + str(record['team']))
+            resp = session.get(url=score_url)
             helpful_assert_equal(resp.json(), {
                 'score': 0.0,
-                'team': str(record['team'])
+                'team': team_s
             })
 
         print(
             "    Confirm that revocable-dead flags only count after they expire"
         )
-        record = {'team': randint(10**35, 10**36), 'flag': flags[6]['flag']}
+        record = {'team': random_team_id(), 'flag': flags[6]['flag']}
         flags_record.append(record)
-        resp = requests.post(
-            url=api_endpoint + "/flag",
-            json=record,
-            headers={
-                'Content-Type': 'application/json'
-            })
+        team_s = str(record['team'])
+        score_url = api_endpoint + "/score/" + team_s
+        resp = post_flag(record)
         helpful_assert_equal(resp.json(), {'valid_flag': True})
-        resp = requests.get(url=api_endpoint + "/score/" + str(record['team']))
+        resp = session.get(url=score_url)
         helpful_assert_equal(resp.json(), {
             'score': 0.0,
-            'team': str(record['team'])
+            'team': team_s
         })
-        time.sleep(1.5 * float(flags[6]['timeout']))
-        resp = requests.get(url=api_endpoint + "/score/" + str(record['team']))
+        resp = wait_for_score(score_url, 7.0, float(flags[6]['timeout']))
         helpful_assert_equal(resp.json(), {
             'score': 7.0,
-            'team': str(record['team'])
+            'team': team_s
         })
 
     except Exception as e:
@@ -407,6 +497,9 @@ def integration_tests(stack_name):
         print(resp.json())
     else:
         print("Tests successful")
+    finally:
+        pool.shutdown()
+        session.close()
 
     for record in flags_record:
         flag = record['flag']
@@ -435,9 +528,9 @@ def integration_tests(stack_name):
 
     print("Cleanup successful")
 
-    update_stack_parameters(stack_name, stack_parameters)
-
-    print("Cache policy restoration complete")
+    if caches_changed:
+        update_stack_parameters(stack_name, stack_parameters)
+        print("Cache policy restoration complete")
 
 
 def populate_flags(table_name=None, timeout=0.5):
@@ -445,80 +538,28 @@ def populate_flags(table_name=None, timeout=0.5):
     Generate and populate a collection of randomly generated flags, and return
     them.
     """
-    flags = [
-        # A simple durable flag
-        {
-            'flag': str(uuid.uuid1())
-        },
-        # A durable flag with an auth key for one team
-        {
-            'flag': str(uuid.uuid1()),
-            'auth_key': {
-                str(randint(10**35, 10**36)): "1"
-            }
-        },
-        # A simple recovable-alive flag, 'yes' unspecified
-        {
-            'flag': str(uuid.uuid1()),
-            'timeout': Decimal(timeout)
-        },
-        # A recovable-alive flag with an auth key for one team, 'yes' unspecified
-        {
-            'flag': str(uuid.uuid1()),
-            'timeout': Decimal(timeout),
-            'auth_key': {
-                str(randint(10**35, 10**36)): "2"
-            }
-        },
-        # A simple recovable-alive flag, 'yes' specified to TRUE
-        {
-            'flag': str(uuid.uuid1()),
-            'timeout': Decimal(timeout),
-            'yes': True
-        },
-        # A recovable-alive flag with an auth key for one team, 'yes' specified to TRUE
-        {
-            'flag': str(uuid.uuid1()),
-            'timeout': Decimal(timeout),
-            'auth_key': {
-                str(randint(10**35, 10**36)): "2"
-            },
-            'yes': True
-        },
-        # A simple recovable-dead flag
-        {
-            'flag': str(uuid.uuid1()),
-            'timeout': Decimal(timeout),
-            'yes': False
-        },
-        # A recovable-dead flag with an auth key for one team
-        {
-            'flag': str(uuid.uuid1()),
-            'timeout': Decimal(timeout),
-            'auth_key': {
-                str(randint(10**35, 10**36)): "3"
-            },
-            'yes': False
-        },
-        # A simple durable flag that WILL NOT HAVE A WEIGHT
-        {
-            'flag': str(uuid.uuid1())
-        },
-    ]
+    timeout = Decimal(timeout)
+    flags = []
+    flag_ids = random_uuids(len(FLAG_TEMPLATES))
+    for flag_id, (auth_value, revocable, yes) in zip(flag_ids, FLAG_TEMPLATES):
+        flag = {'flag': flag_id}
+        if revocable:
+            flag['timeout'] = timeout
+        if auth_value is not None:
+            flag['auth_key'] = {str(random_team_id()): auth_value}
+        if yes is not None:
+            flag['yes'] = yes
+        flags.append(flag)
+
+    # All flags except the last are weighted.
+    for flag_id in range(len(flags) - 1):
+        flags[flag_id]['weight'] = flag_id + 1
 
     if table_name is not None:
-        flags_table = boto3.resource('dynamodb').Table(table_name)
-    else:
-        flags_table = None
-
-    for flag_id in range(len(flags)):
-        flag = flags[flag_id]
-        if flag_id < len(flags) - 1:
-            flag['weight'] = flag_id + 1
-        else:
-            pass
-        if flags_table is not None:
-            flags_table.put_item(Item=flag)
+        flags_table = aws_resource('dynamodb').Table(table_name)
+        with flags_table.batch_writer() as writer:
+            for flag in flags:
+                writer.put_item(Item=flag)
 
     return flags
 
@@ -527,14 +568,14 @@ def setup_s3_backend():
     """
     Create the AWS resources for an S3 key-value backend, and return the event body template
     """
-    s3_client = boto3.client('s3')
-    dynamodb_client = boto3.client('dynamodb')
+    s3_client = aws_client('s3')
+    dynamodb_client = aws_client('dynamodb')
 
-    s3_bucket = str(uuid.uuid1())
-    s3_prefix = str(uuid.uuid1()) + "/" + str(uuid.uuid1())
+    s3_bucket = str(uuid.uuid4())
+    s3_prefix = str(uuid.uuid4()) + "/" + str(uuid.uuid4())
     s3_client.create_bucket(Bucket=s3_bucket)
 
-    flags_table = str(uuid.uuid1())
+    flags_table = str(uuid.uuid4())
     dynamodb_client.create_table(
         TableName=flags_table,
         AttributeDefinitions=[{
@@ -564,10 +605,10 @@ def setup_dynamodb_backend():
     """
     Create the AWS resources for a DynamoDB key-value backend, and return the event body template
     """
-    dynamodb_client = boto3.client('dynamodb')
+    dynamodb_client = aws_client('dynamodb')
 
-    flags_table = str(uuid.uuid1())
-    scores_table = str(uuid.uuid1())
+    flags_table = str(uuid.uuid4())
+    scores_table = str(uuid.uuid4())
 
     dynamodb_client.create_table(
         TableName=flags_table,
@@ -618,8 +659,8 @@ def create_s3_bucket():
     """
     Just create an S3 bucket and return the bucket name.
     """
-    s3_client = boto3.client('s3')
-    bucket_name = str(uuid.uuid1())
+    s3_client = aws_client('s3')
+    bucket_name = str(uuid.uuid4())
     s3_client.create_bucket(Bucket=bucket_name)
     return bucket_name
 
@@ -645,6 +686,5 @@ def __main():
 
 if __name__ == "__main__":
     # Configure the default region for boto3/moto.
-    import os
     os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
     __main()
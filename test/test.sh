@@ -1,12 +1,38 @@
 #!/bin/bash
 
 export PYTHONPATH=..:$PYTHONPATH
-coverage run --branch test/TestScoreCard.py -v
-coverage run --append --branch test/TestS3KeyValueStore.py -v
-coverage run --append --branch test/TestXrayChain.py -v
+
+# Each test module runs in its own interpreter (and so its own moto state), so
+# run them concurrently and combine the coverage data afterwards. Output is
+# buffered per module to keep the verbose test listings readable.
+MODULES="TestScoreCard TestS3KeyValueStore TestXrayChain"
+LOG_DIR=$(mktemp -d)
+PIDS=""
+for module in $MODULES
+do
+    coverage run --parallel-mode --branch test/$module.py -v > $LOG_DIR/$module.log 2>&1 &
+    PIDS="$PIDS $!"
+done
+
+# Wait on each module's job individually, so that a failing module fails the
+# script.
+STATUS=0
+for pid in $PIDS
+do
+    wait $pid || STATUS=1
+done
+for module in $MODULES
+do
+    cat $LOG_DIR/$module.log
+done
+rm -rf $LOG_DIR
+
+coverage combine
 coverage html --include util.py,XrayChain.py,S3KeyValueStore.py,ScoreCardSubmit.py,ScoreCardTally.py
 
 if [ $# -ne 0 ]
 then
     $@
 fi
+
+exit $STATUS
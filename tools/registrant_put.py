@@ -8,11 +8,36 @@
 
 import csv
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import boto3
-from botocore.exceptions import ClientError
+from botocore.config import Config
+
+# The puts are independent, so run them concurrently, letting the adaptive retry
+# mode back off if the table's write capacity is exceeded.
+MAX_WORKERS = 32
+ddb = boto3.client(
+    "dynamodb",
+    config=Config(
+        max_pool_connections=MAX_WORKERS, retries={"mode": "adaptive"}))
+
 
-ddb = boto3.client("dynamodb")
+def put_registrant(item):
+    """
+    Put the registrant, unless their email is already registered, returning the
+    item and the put response (None if they were already registered).
+    """
+    try:
+        resp = ddb.put_item(
+            TableName=sys.argv[2],
+            Item=item,
+            ConditionExpression="attribute_not_exists(email)")
+    except ddb.exceptions.ConditionalCheckFailedException:
+        resp = None
+    return item, resp
 
+
+items = []
 with open(sys.argv[1]) as fp:
     for row in csv.reader(fp):
         if row[0].strip() == "":
@@ -21,7 +46,7 @@ with open(sys.argv[1]) as fp:
         team_id = row[1]
         team_members = [i for i in row[2:] if i != ""]
         for member_email in team_members:
-            item = {
+            items.append({
                 "email": {
                     "S": member_email
                 },
@@ -31,18 +56,13 @@ with open(sys.argv[1]) as fp:
                 "teamId": {
                     "N": str(team_id)
                 }
-            }
-            print(item)
-            try:
-                resp = ddb.put_item(
-                    TableName=sys.argv[2],
-                    Item=item,
-                    ConditionExpression="attribute_not_exists(email)")
-            except ClientError as e:
-                if e.response['Error'][
-                        'Code'] != 'ConditionalCheckFailedException':
-                    raise e
-                else:
-                    resp = None
-                    print("Value already exists, skipping")
-            print(resp)
+            })
+
+with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    futures = [executor.submit(put_registrant, item) for item in items]
+    for future in as_completed(futures):
+        item, resp = future.result()
+        print(item)
+        if resp is None:
+            print("Value already exists, skipping")
+        print(resp)
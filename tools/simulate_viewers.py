@@ -1,77 +1,144 @@
 #!/usr/bin/env python3
 
+import os
+import sys
 import json
 import time
 import asyncio
 import argparse
+import threading
 import multiprocessing
-import concurrent.futures
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
 
-import requests
+import aiohttp
 
-def get_score(session, url):
+# orjson serializes the full stats much faster, when it is available.
+try:
+    import orjson
+
+    def dumps(obj):
+        """
+        Serialize the object to a JSON string with orjson.
+        """
+        return orjson.dumps(obj).decode("utf-8")
+except ImportError:
+    dumps = json.dumps
+
+async def get_score(session, url):
     """
-    Get the scores as a coroutine.
+    Get the scores as a coroutine, with a status code of None if the request
+    fails.
     """
-    print(url)
-    t0 = time.time()
-    resp = session.get(url, stream=False)
-    print(resp)
-    t1 = time.time()
+    # The wall clock timestamps the request, but the duration is measured with
+    # the monotonic clock so that clock adjustments can't distort it.
+    timestamp = time.time()
+    t0 = time.monotonic()
+    try:
+        async with session.get(url) as resp:
+            # Read the whole body, so the connection goes back to the pool.
+            await resp.read()
+        status_code = resp.status
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        # A failed request is recorded rather than raised, since it would
+        # otherwise take down every viewer sharing this process's event loop.
+        status_code = None
+    t1 = time.monotonic()
     return {
         "url": url,
-        "timestamp": t0,
+        "timestamp": timestamp,
         "dt": t1 - t0,
-        "status_code": resp.status_code
+        "status_code": status_code
     }
 
 
-def viewer_main(url, period, teams, queue):
+def viewer_main(url, period, teams, conn, viewer_count, stop):
     """
-    Insertion point to start the viewer under the event loop.
+    Insertion point to start the given number of viewers under one event loop,
+    running until the stop event is set.
     """
+    # Sends to the pipe can block when it is full, so they're made from a
+    # single thread (keeping each batch's bytes together) off the event loop.
+    sender = ThreadPoolExecutor(max_workers=1)
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(viewer(url, period, teams, queue))
+    loop.run_until_complete(
+        viewers(url, period, teams, conn, viewer_count, stop, sender))
+    sender.shutdown(wait=True)
+    conn.close()
 
-async def viewer(url, period, teams, queue):
+async def viewers(url, period, teams, conn, viewer_count, stop, sender):
     """
-    Simulate the actions of a viewer fetching the scores from the API.
+    Run the given number of viewers concurrently, sharing one HTTP session.
 
     URL is of the form:
       https://<URI of API Gateway Stage without trailing slash>
       e.g.: https://84nc624fy9.execute-api.us-east-1.amazonaws.com/Main
     """
-    session = requests.Session()
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(teams)) as executor:
-        loop = asyncio.get_event_loop()
-        while True:
-            start_time = time.time()
-            futures = [
-                loop.run_in_executor(
-                    executor,
-                    get_score,
-                    *(session, "%s/score/%s" % (url, str(team)))
-                ) for team in teams
-            ]
-            for response in await asyncio.gather(*futures):
-                queue.put(response)
-            time.sleep(max(0, start_time + period - time.time()))
+    # One keep-alive connection per team per viewer, so that each refresh can
+    # fetch every team's score concurrently without reconnecting.
+    connector = aiohttp.TCPConnector(
+        limit=len(teams) * viewer_count, keepalive_timeout=75)
+    urls = tuple("%s/score/%s" % (url, str(team)) for team in teams)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[
+            viewer(session, urls, period, conn, stop, sender)
+            for _ in range(viewer_count)
+        ])
+
+async def viewer(session, urls, period, conn, stop, sender):
+    """
+    Simulate the actions of a viewer fetching the scores from the API.
+    """
+    # Pace the refreshes with the event loop's monotonic clock.
+    loop = asyncio.get_event_loop()
+    while not stop.is_set():
+        start_time = loop.time()
+        futures = [get_score(session, score_url) for score_url in urls]
+        # Publish each refresh's responses as one batch, to write to the pipe
+        # once per refresh rather than once per team.
+        batch = await asyncio.gather(*futures)
+        await loop.run_in_executor(sender, conn.send, batch)
+        await asyncio.sleep(max(0, start_time + period - loop.time()))
+
+
+def receive_stats(conns, stats, timeout=None):
+    """
+    Add the batches from any viewer pipes that become readable within the
+    timeout to the stats, dropping pipes from the list once their viewer exits.
+    A viewer that dies part way through a send leaves a truncated batch, which
+    is dropped along with its pipe.
+    """
+    for conn in wait(conns, timeout):
+        try:
+            stats.extend(conn.recv())
+        except (EOFError, OSError):
+            conns.remove(conn)
 
 
 def stat_summary(stats):
-    min_dt = min([s["dt"] for s in stats])
-    max_dt = max([s["dt"] for s in stats])
-    mean_dt = sum([s["dt"] for s in stats]) / len(stats)
-    status_codes = dict([
-        (str(k), v) for k, v in
-        Counter([s["status_code"] for s in stats]).items()
-    ])
+    """
+    Summarise the request durations and status codes in a single pass over the
+    stats.
+    """
+    min_dt = float("inf")
+    max_dt = float("-inf")
+    total_dt = 0.0
+    status_codes = Counter()
+    for s in stats:
+        dt = s["dt"]
+        if dt < min_dt:
+            min_dt = dt
+        if dt > max_dt:
+            max_dt = dt
+        total_dt += dt
+        status_codes[s["status_code"]] += 1
     return {
         "min_dt": min_dt,
-        "mean_dt": mean_dt,
+        "mean_dt": total_dt / len(stats),
         "max_dt": max_dt,
-        "status_codes": status_codes
+        "status_codes": dict(
+            (str(k), v) for k, v in status_codes.items())
     }
 
 def main():
@@ -111,33 +178,60 @@ def main():
         help="Dump the full JSON representation of the stats for all requests."
     )
     pargs = parser.parse_args()
-    stats_queue = multiprocessing.Queue()
 
-    # For each viewer, spawn a process and let them go at it.
+    # Split the teams once, rather than once per process.
+    teams = tuple(sys.intern(team) for team in pargs.teams.split(","))
+
+    # Spread the viewers as evenly as possible across one process per core, and
+    # let them go at it. Each process sends its stats back over its own one-way
+    # pipe.
+    worker_count = max(1, min(os.cpu_count() or 1, pargs.viewer_count))
+    per_worker, extra = divmod(pargs.viewer_count, worker_count)
+    pipes = [multiprocessing.Pipe(duplex=False) for _ in range(worker_count)]
+    stop = multiprocessing.Event()
     procs = [
         multiprocessing.Process(
             target=viewer_main,
-            args=(pargs.api_url, pargs.viewer_period, pargs.teams.split(","), stats_queue)) for
-        _ in range(pargs.viewer_count)
+            args=(pargs.api_url, pargs.viewer_period, teams, send_conn,
+                  per_worker + (1 if worker < extra else 0), stop)) for
+        worker, (_, send_conn) in enumerate(pipes)
     ]
 
     for proc in procs:
         proc.start()
 
+    # Close this process's copies of the sending ends, so that each pipe reports
+    # EOF once its viewer process exits.
+    conns = []
+    for recv_conn, send_conn in pipes:
+        send_conn.close()
+        conns.append(recv_conn)
+
     print("Press Enter to stop testing")
-    input()
 
-    for proc in procs:
-        proc.terminate()
-    
+    def wait_for_enter():
+        input()
+        stop.set()
+
+    threading.Thread(target=wait_for_enter, daemon=True).start()
+
+    # A pipe only buffers a little before the viewer writing to it blocks, so
+    # keep reading until told to stop.
     stats = []
-    while not stats_queue.empty():
-        stats.append(stats_queue.get())
-    
+    while not stop.is_set():
+        receive_stats(conns, stats, timeout=0.5)
+
+    # The viewers finish their current refresh and exit, so keep reading what
+    # they send until every pipe reports EOF.
+    while conns:
+        receive_stats(conns, stats)
+    for proc in procs:
+        proc.join()
+
     if pargs.full_stats:
-        print(json.dumps(stats))
+        print(dumps(stats))
     else:
-        print(json.dumps(stat_summary(stats)))
+        print(dumps(stat_summary(stats)))
 
 if __name__ == "__main__":
     main()
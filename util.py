@@ -5,9 +5,28 @@ functions.
 
 import os
 import json
+from math import frexp, ldexp
 from random import random
 from functools import wraps
-from XrayChain import Chain as XrayChain
+from XrayChain import Chain as XrayChain, NullChain
+
+# Lambda environment variables are fixed for the life of the container, so the
+# sampling rate and debug flag are read once, when the module is loaded.
+try:
+    XRAY_SAMPLE_RATE = float(os.environ.get("XraySampleRate", 0.0))
+except Exception:
+    XRAY_SAMPLE_RATE = 0.0
+
+DEBUG = os.environ.get("DEBUG", None) == "TRUE"
+
+# Passed to calls that aren't sampled, in place of a real chain.
+NULL_CHAIN = NullChain()
+
+# The parts of each root segment that are the same on every call, built once.
+# The response dicts are shared between segments, and are only ever serialized.
+ANNOTATIONS_TEMPLATE = {"Application": "Scorecard"}
+HTTP_OK = {"status": 200}
+HTTP_CLIENT_ERROR = {"status": 400}
 
 
 def traced_lambda(name):
@@ -23,17 +42,18 @@ def traced_lambda(name):
             event = args[0]
             context = args[1]
 
-            # To decide whether or not to trace this call (for real),
-            # use the OS environment variable (choosing 0.0 if the )
-            try:
-                sample_probability = float(
-                    os.environ.get("XraySampleRate", 0.0))
-            except Exception:
-                sample_probability = 0.0
-
             # mock the Xray API calls if and only if the random() value is
             # NOT less than the sample probability.
-            mock = random() >= sample_probability
+            mock = XRAY_SAMPLE_RATE <= 0.0 or random() >= XRAY_SAMPLE_RATE
+
+            if mock:
+                # Nothing would be sent for this call, so skip building the
+                # trace segments entirely.
+                ret = target(*(args + (NULL_CHAIN, )))
+                ret.pop("annotations", None)
+                if DEBUG:
+                    ret["Debug"] = {"MockedXray": mock}
+                return ret
 
             root_chain = XrayChain(mock=mock)
             segment_id = root_chain.log_start(name=name)
@@ -42,36 +62,29 @@ def traced_lambda(name):
             # Actually invoke the function being wrapped
             ret = target(*(args + (task_chain, )))
 
-            if "team" in args[0]:
+            team = event.get("team")
+            if team is not None:
                 http = {
                     "request": {
-                        "url": "/score/" + str(event["team"]),
+                        "url": "/score/" + str(team),
                         "method": "GET"
                     },
-                    "response": {
-                        "status": 200,
-                        "content_length": -1
-                    }
+                    "response": (HTTP_CLIENT_ERROR
+                                 if "ClientError" in ret else HTTP_OK)
                 }
-                if "ClientError" in ret:
-                    http["response"] = {"status": 400}
-                else:
-                    http["response"] = {"status": 200}
             else:
                 http = None
 
-            annotations = {
-                "Application": "Scorecard",
-                "BackendType": event["KeyValueBackend"]
-            }
+            annotations = ANNOTATIONS_TEMPLATE.copy()
+            annotations["BackendType"] = event["KeyValueBackend"]
             if context is not None:
                 annotations["AWSRequestId"] = context.aws_request_id
 
-            if "annotations" in ret:
-                annotations.update(ret["annotations"])
-                del ret["annotations"]
+            ret_annotations = ret.pop("annotations", None)
+            if ret_annotations is not None:
+                annotations.update(ret_annotations)
 
-            if os.environ.get("DEBUG", None) == "TRUE":
+            if DEBUG:
                 ret["Debug"] = {"MockedXray": mock}
 
             try:
@@ -114,23 +127,53 @@ def coin_toss(flips, heads, p_head=0.5):
     """
     # p^m (1-p)^(n-m) Binomial[n,m]
     binomial = binomial_list(flips, heads)
-    probabilities = [float(p_head) for _ in xrange(heads)
-                     ] + [float(1 - p_head) for _ in xrange(flips - heads)]
-    return reduce(lambda a, b: a * b,
-                  [a * b for a, b in zip(binomial, probabilities)])
+    probabilities = [float(p_head) for _ in range(heads)
+                     ] + [float(1 - p_head) for _ in range(flips - heads)]
+    # The running product's binary exponent is kept separately, so that it
+    # can't underflow part way through when the result itself is representable.
+    # Scaling by a power of two is exact, so otherwise this is the plain product.
+    mantissa, exponent = 1.0, 0
+    for a, b in zip(binomial, probabilities):
+        mantissa, shift = frexp(mantissa * (a * b))
+        exponent += shift
+    return ldexp(mantissa, exponent)
 
 
 def coin_toss_range(flips, min_heads, max_heads, p_head):
     """
     Return the probability of getting between the min and max number of heads
     out of the given number of flips, with the given probability of a head.
+
+    Only the probability for the most likely number of heads in the range is
+    computed in full. The rest are found by stepping outwards from it, using the
+    ratio between the probabilities of adjacent numbers of heads.
     """
     if min_heads < 0 or max_heads > flips:
         return float('nan')
-    return sum([
-        coin_toss(flips, heads, p_head)
-        for heads in xrange(min_heads, max_heads + 1)
-    ])
+    if min_heads > max_heads:
+        return 0.0
+
+    p_head = float(p_head)
+    if p_head == 0.0 or p_head == 1.0:
+        # Every flip comes up the same way, so only one number of heads is
+        # possible.
+        heads = 0 if p_head == 0.0 else flips
+        return 1.0 if min_heads <= heads <= max_heads else 0.0
+
+    odds = p_head / (1 - p_head)
+    mode = min(max(int((flips + 1) * p_head), min_heads), max_heads)
+    mode_prob = coin_toss(flips, mode, p_head)
+
+    total = mode_prob
+    prob = mode_prob
+    for heads in range(mode, max_heads):
+        prob *= odds * (flips - heads) / (heads + 1)
+        total += prob
+    prob = mode_prob
+    for heads in range(mode, min_heads, -1):
+        prob *= heads / ((flips - heads + 1) * odds)
+        total += prob
+    return total
 
 
 def coin_toss_counts(p_head, min_rate, max_rate, p_cutoff=0.999):
@@ -158,7 +201,7 @@ def coin_toss_counts(p_head, min_rate, max_rate, p_cutoff=0.999):
             flips += dflips
         elif dflips > 1:
             flips -= dflips
-            dflips /= 2
+            dflips //= 2
             flips += dflips
         else:
             break